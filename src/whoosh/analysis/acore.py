@@ -70,6 +70,57 @@ def entoken(textstream, positions=False, chars=False, start_pos=0,
         yield t
 
 
+# Batch tokenization
+
+# Analyzer and keyword arguments for tokenize_batch() worker processes, set by
+# the pool initializer so they are only pickled once per process
+_batch_analyzer = None
+_batch_kwargs = None
+
+
+def _batch_init(analyzer, kwargs):
+    global _batch_analyzer, _batch_kwargs
+    _batch_analyzer = analyzer
+    _batch_kwargs = kwargs
+
+
+def _batch_tokens(text):
+    return [t.copy() for t in _batch_analyzer(text, **_batch_kwargs)]
+
+
+def tokenize_batch(analyzer, texts, procs=None, chunksize=64, **kwargs):
+    """Runs an analyzer over a sequence of unicode strings using a pool of
+    worker processes, and yields a list of Token objects for each string, in
+    the same order as ``texts``. Any extra keyword arguments are passed to the
+    analyzer.
+
+    Because the tokens have to be sent back from the workers, each list
+    contains separate copies of the tokens (unlike a token stream, which yields
+    the same Token object over and over). The analyzer must be picklable.
+
+    :param analyzer: the analyzer (or tokenizer) to run.
+    :param texts: a sequence of unicode strings.
+    :param procs: the number of worker processes to use. The default is the
+        number of CPUs. If this is 1, the strings are analyzed in the current
+        process.
+    :param chunksize: the number of strings to send to a worker at a time.
+    """
+
+    if procs == 1:
+        for text in texts:
+            yield [t.copy() for t in analyzer(text, **kwargs)]
+        return
+
+    from multiprocessing import Pool
+
+    pool = Pool(procs, _batch_init, (analyzer, kwargs))
+    try:
+        for tokens in pool.imap(_batch_tokens, texts, chunksize):
+            yield tokens
+    finally:
+        pool.terminate()
+
+
 # Token object
 
 class Token(object):
@@ -101,6 +152,13 @@ class Token(object):
     ...or, call token.copy() to get a copy of the token object.
     """
 
+    # The attributes every tokenizer and the core filters use are slots, so
+    # creating a Token doesn't allocate an attribute dictionary. The
+    # __dict__ slot still lets filters attach arbitrary extra attributes
+    __slots__ = ("positions", "chars", "stopped", "boost", "removestops",
+                 "mode", "text", "original", "pos", "startchar", "endchar",
+                 "__dict__")
+
     def __init__(self, positions=False, chars=False, removestops=True, mode='',
                  **kwargs):
         """
@@ -120,16 +178,48 @@ class Token(object):
         self.boost = 1.0
         self.removestops = removestops
         self.mode = mode
-        self.__dict__.update(kwargs)
+        if kwargs:
+            for name, value in iteritems(kwargs):
+                setattr(self, name, value)
+
+    def _items(self):
+        # Yields (name, value) pairs for every attribute set on this token
+        for name in _token_slots:
+            try:
+                yield name, getattr(self, name)
+            except AttributeError:
+                pass
+        for item in iteritems(self.__dict__):
+            yield item
 
     def __repr__(self):
         parms = ", ".join("%s=%r" % (name, value)
-                          for name, value in iteritems(self.__dict__))
+                          for name, value in self._items())
         return "%s(%s)" % (self.__class__.__name__, parms)
 
+    def __getstate__(self):
+        return dict(self._items())
+
+    def __setstate__(self, state):
+        for name, value in iteritems(state):
+            setattr(self, name, value)
+
     def copy(self):
         # This is faster than using the copy module
-        return Token(**self.__dict__)
+        t = Token.__new__(self.__class__)
+        for name in _token_slots:
+            value = getattr(self, name, _unset)
+            if value is not _unset:
+                setattr(t, name, value)
+        extra = self.__dict__
+        if extra:
+            t.__dict__.update(extra)
+        return t
+
+
+_token_slots = Token.__slots__[:-1]
+# Marks slots that haven't been assigned, e.g. "pos" when positions are off
+_unset = object()
 
 
 # Composition support
@@ -145,11 +235,11 @@ class Composable(object):
         return CompositeAnalyzer(self, other)
 
     def __repr__(self):
-        attrs = ""
-        if self.__dict__:
-            attrs = ", ".join("%s=%r" % (key, value)
-                              for key, value
-                              in iteritems(self.__dict__))
+        # Underscored attributes are derived state (caches, compiled
+        # expressions), not arguments, so leave them out
+        attrs = ", ".join("%s=%r" % (key, value)
+                          for key, value in iteritems(self.__dict__)
+                          if not key.startswith("_"))
         return self.__class__.__name__ + "(%s)" % attrs
 
     def has_morph(self):
@@ -25,10 +25,13 @@
 # those of the authors and should not be interpreted as representing official
 # policies, either expressed or implied, of Matt Chaput.
 
+import re
+import sys as _sys
+
 from whoosh.analysis.acore import Composable, CompositionError
 from whoosh.analysis.tokenizers import Tokenizer
-from whoosh.analysis.filters import LowercaseFilter
-from whoosh.analysis.filters import StopFilter, STOP_WORDS
+from whoosh.analysis.filters import LowercaseFilter, StripFilter
+from whoosh.analysis.filters import StopFilter, STOP_WORDS, _longest_word
 from whoosh.analysis.morph import StemFilter
 from whoosh.analysis.intraword import IntraWordFilter
 from whoosh.analysis.tokenizers import default_pattern
@@ -36,7 +39,90 @@ from whoosh.analysis.tokenizers import CommaSeparatedTokenizer
 from whoosh.analysis.tokenizers import IDTokenizer
 from whoosh.analysis.tokenizers import RegexTokenizer
 from whoosh.analysis.tokenizers import SpaceSeparatedTokenizer
+from whoosh.compat import text_type
 from whoosh.lang.porter import stem
+from whoosh.util.text import sre_parse as _sre_parse
+
+
+# Expressions whose matches can never start or end with whitespace (unless
+# compiled with re.ASCII, where \S matches Unicode spaces such as NBSP)
+
+_unpadded_patterns = frozenset([default_pattern.pattern, r"\w+", r"\S+"])
+
+# Parser opcodes for repeated subpatterns, and for items that match upper and
+# lower case letters alike
+_repeat_ops = frozenset(getattr(_sre_parse, name) for name
+                        in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+                        if hasattr(_sre_parse, name))
+_caseless_ops = frozenset([_sre_parse.ANY, _sre_parse.AT, _sre_parse.CATEGORY,
+                           _sre_parse.NEGATE])
+
+
+def _caseless(expression):
+    """Returns True if lowercasing ASCII text can't change what the given
+    compiled expression matches, i.e. every part of the pattern that could
+    match an ASCII letter does so case-insensitively.
+    """
+
+    if (not isinstance(expression, re.Pattern)
+            or not isinstance(expression.pattern, text_type)):
+        return False
+    try:
+        parsed = _sre_parse.parse(expression.pattern, expression.flags)
+    except (re.error, TypeError):
+        return False
+    return _caseless_items(parsed, bool(parsed.state.flags & re.IGNORECASE))
+
+
+def _touches_letters(lo, hi):
+    # True if the code point range includes any ASCII letters
+    return (lo <= 0x5A and hi >= 0x41) or (lo <= 0x7A and hi >= 0x61)
+
+
+def _caseless_items(items, ignorecase):
+    for op, av in items:
+        if op in _caseless_ops:
+            continue
+        elif op is _sre_parse.LITERAL or op is _sre_parse.NOT_LITERAL:
+            if not ignorecase and _touches_letters(av, av):
+                return False
+        elif op is _sre_parse.RANGE:
+            if not ignorecase and _touches_letters(*av):
+                return False
+        elif op is _sre_parse.IN:
+            if not _caseless_items(av, ignorecase):
+                return False
+        elif op is _sre_parse.SUBPATTERN:
+            # Scoped flags, e.g. (?i:...) or (?-i:...)
+            _, addflags, delflags, sub = av
+            subcase = ((ignorecase or addflags & re.IGNORECASE)
+                       and not delflags & re.IGNORECASE)
+            if not _caseless_items(sub, subcase):
+                return False
+        elif op is _sre_parse.BRANCH:
+            if not all(_caseless_items(sub, ignorecase) for sub in av[1]):
+                return False
+        elif op in _repeat_ops:
+            if not _caseless_items(av[2], ignorecase):
+                return False
+        elif op is _sre_parse.ASSERT or op is _sre_parse.ASSERT_NOT:
+            if not _caseless_items(av[1], ignorecase):
+                return False
+        elif op is getattr(_sre_parse, "ATOMIC_GROUP", None):
+            if not _caseless_items(av, ignorecase):
+                return False
+        elif op is _sre_parse.GROUPREF_EXISTS:
+            if not all(_caseless_items(sub, ignorecase) for sub in av[1:]
+                       if sub is not None):
+                return False
+        elif op is _sre_parse.GROUPREF:
+            # A backreference repeats the matched text's case exactly
+            if not ignorecase:
+                return False
+        else:
+            # Anything we don't know about might care about case
+            return False
+    return True
 
 
 # Analyzers
@@ -49,9 +135,10 @@ class Analyzer(Composable):
         return "%s()" % self.__class__.__name__
 
     def __eq__(self, other):
-        return (other
-                and self.__class__ is other.__class__
-                and self.__dict__ == other.__dict__)
+        return (self is other
+                or (other
+                    and self.__class__ is other.__class__
+                    and self.__dict__ == other.__dict__))
 
     def __call__(self, value, **kwargs):
         raise NotImplementedError
@@ -78,18 +165,184 @@ class CompositeAnalyzer(Analyzer):
                 raise CompositionError("Only one tokenizer allowed at the start"
                                        " of the analyzer: %r" % self.items)
 
+        self._setup()
+
+    def __getstate__(self):
+        # The underscored attributes are derived from the items, so don't
+        # pickle them
+        return dict([(k, self.__dict__[k]) for k in self.__dict__
+                     if not k.startswith("_")])
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._setup()
+
+    def _setup(self):
+        # When the value isn't tokenized, the tokenizer passes it through whole
+        # (possibly padded), so those calls always run every filter
+        self._untokenized = None
+        if not self.items:
+            self._chain = self._nomorph_chain = ()
+            self._fused = None
+            self._prelower = False
+            return
+
+        filters = list(self.items[1:])
+        tokenizer = self.items[0]
+        if (type(tokenizer) is RegexTokenizer and not tokenizer.gaps
+                and tokenizer.expression.pattern in _unpadded_patterns
+                and not tokenizer.expression.flags & re.ASCII):
+            # The tokens can't have leading or trailing whitespace, so any
+            # StripFilter before a filter that might add some is a no-op
+            i = 0
+            while (i < len(filters)
+                   and type(filters[i]) in (LowercaseFilter, StripFilter)):
+                if type(filters[i]) is StripFilter:
+                    del filters[i]
+                else:
+                    i += 1
+            if len(filters) < len(self.items) - 1:
+                allfilters = tuple(self.items[1:])
+                self._untokenized = (
+                    allfilters,
+                    tuple(item for item in allfilters
+                          if not getattr(item, "is_morph", False)))
+
+        # is_morph is a class attribute, so the filters to run for each value
+        # of no_morph are fixed for the life of the composite
+        self._chain = tuple(filters)
+        self._nomorph_chain = tuple(item for item in filters
+                                    if not getattr(item, "is_morph", False))
+        self._try_fuse()
+
+    def _try_fuse(self):
+        # If the filters are a LowercaseFilter followed by a StopFilter and/or
+        # a StemFilter (the shape of the standard, stemming and language
+        # analyzers), remember them so __call__ can run their bodies in a
+        # single loop instead of stacking a generator per filter. Subclasses
+        # of these filters may override __call__, so only exact class matches
+        # are fused, except for stemmers (e.g. PyStemmerFilter) that only swap
+        # out the stemming function
+        self._fused = None
+        self._prelower = False
+        filters = list(self._chain)
+        if (not self.items or not filters
+                or type(filters[0]) is not LowercaseFilter):
+            return
+        del filters[0]
+
+        # If the tokenizer's expression doesn't care about case, ASCII values
+        # can be lowercased with one str.lower() call before tokenizing. That
+        # can't change the length of the value or the spans that match
+        tokenizer = self.items[0]
+        self._prelower = (type(tokenizer) is RegexTokenizer
+                          and _caseless(tokenizer.expression))
+
+        stopfilter = stemfilter = None
+        if filters and type(filters[0]) is StopFilter:
+            stopfilter = filters.pop(0)
+        if filters and type(filters[0]).__call__ is StemFilter.__call__:
+            stemfilter = filters.pop(0)
+        if filters:
+            return
+        if stopfilter is None and stemfilter is None and not self._prelower:
+            # Just a LowercaseFilter, there's nothing to gain
+            return
+        self._fused = (stopfilter, stemfilter)
+
+    def _fused_call(self, value, no_morph, **kwargs):
+        lowered = False
+        # Untokenized values are always kept as the token's original text, so
+        # they mustn't be lowercased up front either
+        if (self._prelower and isinstance(value, text_type)
+                and value.isascii() and not kwargs.get("keeporiginal")
+                and kwargs.get("tokenize", True)):
+            value = value.lower()
+            lowered = True
+        tokens = self.items[0](value, **kwargs)
+
+        stopfilter, stemfilter = self._fused
+        if stopfilter is None and stemfilter is None:
+            # The composite is just the tokenizer and a LowercaseFilter
+            return tokens if lowered else self._chain[0](tokens)
+        return self._fused_filter(tokens, lowered, no_morph)
+
+    def _fused_filter(self, tokens, lowered, no_morph):
+        stopfilter, stemfilter = self._fused
+        stemfn = None
+        if stemfilter is not None and not no_morph:
+            stemfn = stemfilter._stem
+            ignore = stemfilter.ignore
+
+        if stopfilter is None:
+            for t in tokens:
+                text = t.text
+                if not lowered:
+                    text = text.lower()
+                if stemfn is not None and not t.stopped and text not in ignore:
+                    text = stemfn(text)
+                t.text = text
+                yield t
+            return
+
+        stoplist = stopfilter.stops
+        minsize = stopfilter.min
+        maxsize = stopfilter.max
+        if maxsize is None:
+            maxsize = _sys.maxsize
+        maxstop = _longest_word(stoplist)
+        renumber = stopfilter.renumber
+
+        pos = None
+        for t in tokens:
+            text = t.text
+            if not lowered:
+                text = text.lower()
+            size = len(text)
+            if (minsize <= size <= maxsize
+                    and (size > maxstop or text not in stoplist)):
+                # This is not a stop word
+                if renumber and t.positions:
+                    if pos is None:
+                        pos = t.pos
+                    else:
+                        pos += 1
+                        t.pos = pos
+                if t.stopped:
+                    t.stopped = False
+                if stemfn is not None and text not in ignore:
+                    text = stemfn(text)
+                t.text = text
+                yield t
+            elif not t.removestops:
+                # This IS a stop word, but we're not removing them
+                t.text = text
+                t.stopped = True
+                yield t
+
     def __repr__(self):
         return "%s(%s)" % (self.__class__.__name__,
                            ", ".join(repr(item) for item in self.items))
 
     def __call__(self, value, no_morph=False, **kwargs):
-        items = self.items
+        if (self._untokenized is not None
+                and not kwargs.get("tokenize", True)):
+            # Some StripFilters were dropped from the chains, but they're
+            # needed for an untokenized value
+            chain = self._untokenized[1 if no_morph else 0]
+        elif self._fused is not None:
+            return self._fused_call(value, no_morph, **kwargs)
+        else:
+            chain = self._nomorph_chain if no_morph else self._chain
         # Start with tokenizer
-        gen = items[0](value, **kwargs)
+        gen = self.items[0](value, **kwargs)
+        if len(chain) == 1:
+            # A tokenizer and a single filter, e.g. KeywordAnalyzer with
+            # lowercase=True
+            return chain[0](gen)
         # Run filters
-        for item in items[1:]:
-            if not (no_morph and hasattr(item, "is_morph") and item.is_morph):
-                gen = item(gen)
+        for item in chain:
+            gen = item(gen)
         return gen
 
     def __getitem__(self, item):
@@ -99,9 +352,12 @@ class CompositeAnalyzer(Analyzer):
         return len(self.items)
 
     def __eq__(self, other):
-        return (other
-                and self.__class__ is other.__class__
-                and self.items == other.items)
+        # Schemas compare their analyzers often, and usually against the same
+        # object, so check identity before comparing the items one by one.
+        # Only the items define a composite; the rest is derived from them
+        return (self is other
+                or (self.__class__ is other.__class__
+                    and self.items == other.items))
 
     def clean(self):
         for item in self.items:
@@ -27,6 +27,8 @@
 # those of the authors and should not be interpreted as representing official
 # policies, either expressed or implied, of Matt Chaput.
 
+import sys as _sys
+from functools import lru_cache as _lru_cache
 from itertools import chain
 
 from whoosh.compat import next
@@ -58,6 +60,23 @@ url_pattern = rcompile("""
 """, verbose=True)
 
 
+# Utility functions
+
+def _longest_word(words):
+    # Length of the longest string in a stop list. Cached for frozensets
+    # (which cache their hash, and are usually shared by many filters), but
+    # the stops attribute can also be replaced with an unhashable set
+    try:
+        return _cached_longest_word(words)
+    except TypeError:
+        return max([len(w) for w in words] or [0])
+
+
+@_lru_cache(maxsize=128)
+def _cached_longest_word(words):
+    return max([len(w) for w in words] or [0])
+
+
 # Filters
 
 class Filter(Composable):
@@ -70,9 +89,10 @@ class Filter(Composable):
     """
 
     def __eq__(self, other):
-        return (other
-                and self.__class__ is other.__class__
-                and self.__dict__ == other.__dict__)
+        return (self is other
+                or (other
+                    and self.__class__ is other.__class__
+                    and self.__dict__ == other.__dict__))
 
     def __ne__(self, other):
         return not self == other
@@ -106,6 +126,15 @@ class LoggingFilter(Filter):
         self.logger = logger
 
     def __call__(self, tokens):
+        import logging
+
+        # If debug messages would be discarded anyway, don't wrap the stream
+        # in another generator just to format and throw away every token
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return tokens
+        return self._log(tokens)
+
+    def _log(self, tokens):
         logger = self.logger
         for t in tokens:
             logger.debug(repr(t))
@@ -139,9 +168,15 @@ class MultiFilter(Filter):
 
     def __call__(self, tokens):
         # Only selects on the first token
-        t = next(tokens)
+        tokens = iter(tokens)
+        try:
+            t = next(tokens)
+        except StopIteration:
+            # Empty stream
+            return iter(())
         filter = self.filters.get(t.mode, self.default_filter)
-        return filter(chain([t], tokens))
+        # A one-item tuple is cheaper to build than a list
+        return filter(chain((t,), tokens))
 
 
 class TeeFilter(Filter):
@@ -271,15 +306,17 @@ class StopFilter(Filter):
             language
         """
 
-        stops = set()
-        if stoplist:
-            stops.update(stoplist)
+        if isinstance(stoplist, frozenset):
+            # Share an existing frozenset (e.g. STOP_WORDS) instead of copying
+            stops = stoplist
+        else:
+            stops = frozenset(stoplist or ())
         if lang:
             from whoosh.lang import stopwords_for_language
 
-            stops.update(stopwords_for_language(lang))
+            stops = stops.union(stopwords_for_language(lang))
 
-        self.stops = frozenset(stops)
+        self.stops = stops
         self.min = minsize
         self.max = maxsize
         self.renumber = renumber
@@ -289,28 +326,50 @@ class StopFilter(Filter):
                 and self.__class__ is other.__class__
                 and self.stops == other.stops
                 and self.min == other.min
+                and self.max == other.max
                 and self.renumber == other.renumber)
 
     def __call__(self, tokens):
         stoplist = self.stops
         minsize = self.min
-        maxsize = self.max
+        # Resolve the optional maximum once so the length test in the loop
+        # is a single chained comparison
+        maxsize = self.max if self.max is not None else _sys.maxsize
+        # Tokens longer than the longest stop word can't be stop words, which
+        # saves hashing long tokens just to miss in the set
+        maxstop = _longest_word(stoplist)
         renumber = self.renumber
 
+        if not renumber:
+            # Without renumbering the loop only has to mark or drop stop words
+            for t in tokens:
+                text = t.text
+                size = len(text)
+                if (minsize <= size <= maxsize
+                        and (size > maxstop or text not in stoplist)):
+                    if t.stopped:
+                        t.stopped = False
+                    yield t
+                elif not t.removestops:
+                    t.stopped = True
+                    yield t
+            return
+
         pos = None
         for t in tokens:
             text = t.text
-            if (len(text) >= minsize
-                and (maxsize is None or len(text) <= maxsize)
-                and text not in stoplist):
+            size = len(text)
+            if (minsize <= size <= maxsize
+                    and (size > maxstop or text not in stoplist)):
                 # This is not a stop word
-                if renumber and t.positions:
+                if t.positions:
                     if pos is None:
                         pos = t.pos
                     else:
                         pos += 1
                         t.pos = pos
-                t.stopped = False
+                if t.stopped:
+                    t.stopped = False
                 yield t
             else:
                 # This is a stop word
@@ -25,11 +25,12 @@
 # those of the authors and should not be interpreted as representing official
 # policies, either expressed or implied, of Matt Chaput.
 
+from functools import lru_cache as _lru_cache
+
 from whoosh.analysis.filters import Filter
 from whoosh.compat import integer_types
 from whoosh.lang.dmetaphone import double_metaphone
 from whoosh.lang.porter import stem
-from whoosh.util.cache import lfu_cache, unbound_cache
 
 
 class StemFilter(Filter):
@@ -62,8 +63,9 @@ class StemFilter(Filter):
     disable caching, use ``cachesize=None``.
 
     If you compile and install the py-stemmer library, the
-    :class:`PyStemmerFilter` provides slightly easier access to the language
-    stemmers in that library.
+    :class:`PyStemmerFilter` provides access to the language stemmers in that
+    library, which are implemented in C and are much faster than the
+    pure-Python stemmers used by this class.
     """
 
     __inittypes__ = dict(stemfn=object, ignore=list)
@@ -120,16 +122,19 @@ class StemFilter(Filter):
         else:
             stemfn = self.stemfn
 
+        # Word forms follow a Zipfian distribution, so a small cache in front
+        # of the stemmer answers most lookups. functools.lru_cache is
+        # implemented in C, and with maxsize=None it is a plain dict lookup
         if isinstance(self.cachesize, integer_types) and self.cachesize != 0:
             if self.cachesize < 0:
-                self._stem = unbound_cache(stemfn)
-            elif self.cachesize > 1:
-                self._stem = lfu_cache(self.cachesize)(stemfn)
+                self._stem = _lru_cache(maxsize=None)(stemfn)
+            else:
+                self._stem = _lru_cache(maxsize=self.cachesize)(stemfn)
         else:
             self._stem = stemfn
 
     def cache_info(self):
-        if self.cachesize <= 1:
+        if not hasattr(self._stem, "cache_info"):
             return None
         return self._stem.cache_info()
 
@@ -145,7 +150,10 @@ class StemFilter(Filter):
             if not t.stopped:
                 text = t.text
                 if text not in ignore:
-                    t.text = stemfn(text)
+                    stemmed = stemfn(text)
+                    # Skip the store when the stemmer returned the word as-is
+                    if stemmed is not text:
+                        t.text = stemmed
             yield t
 
 
@@ -172,8 +180,18 @@ class PyStemmerFilter(StemFilter):
         self.lang = lang
         self.ignore = frozenset() if ignore is None else frozenset(ignore)
         self.cachesize = cachesize
+        self.clear()
+
+    def clear(self):
+        # Overrides StemFilter.clear(), which would otherwise replace the
+        # py-stemmer function with a pure-Python stemmer for self.lang
         self._stem = self._get_stemmer_fn()
 
+    def __eq__(self, other):
+        return (other and self.__class__ is other.__class__
+                and self.lang == other.lang
+                and self.ignore == other.ignore)
+
     def algorithms(self):
         """Returns a list of stemming algorithms provided by the py-stemmer
         library.
@@ -213,7 +231,7 @@ class PyStemmerFilter(StemFilter):
 
         self.__dict__.update(state)
         # Set the _stem attribute
-        self._stem = self._get_stemmer_fn()
+        self.clear()
 
 
 class DoubleMetaphoneFilter(Filter):
@@ -25,14 +25,23 @@
 # those of the authors and should not be interpreted as representing official
 # policies, either expressed or implied, of Matt Chaput.
 
-from whoosh.compat import u, text_type
+import re
+from functools import lru_cache as _lru_cache
+
+from whoosh.compat import text_type, unichr
 from whoosh.analysis.acore import Composable, Token
-from whoosh.util.text import rcompile
+from whoosh.util.text import rcompile, sre_parse as _sre_parse
 
 
 default_pattern = rcompile(r"\w+(\.?\w+)*")
 
 
+@_lru_cache(maxsize=512)
+def _min_match_length(pattern, flags):
+    # Returns the length of the shortest string the expression can match
+    return _sre_parse.parse(pattern, flags).getwidth()[0]
+
+
 # Tokenizers
 
 
@@ -92,6 +101,28 @@ class RegexTokenizer(Tokenizer):
 
         self.expression = rcompile(expression)
         self.gaps = gaps
+        self._setup()
+
+    def __getstate__(self):
+        return dict(item for item in self.__dict__.items()
+                    if not item[0].startswith("_"))
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._setup()
+
+    def _setup(self):
+        # Text shorter than this can't contain a match, so the tokenizer can
+        # skip running the expression over it. Only the re module's patterns
+        # can be measured; other pattern objects with a compatible finditer()
+        # always run
+        expr = self.expression
+        self._minlen = 0
+        if isinstance(expr, re.Pattern):
+            try:
+                self._minlen = _min_match_length(expr.pattern, expr.flags)
+            except (re.error, TypeError):
+                pass
 
     def __eq__(self, other):
         if self.__class__ is other.__class__:
@@ -128,19 +159,45 @@ class RegexTokenizer(Tokenizer):
                 t.startchar = start_char
                 t.endchar = start_char + len(value)
             yield t
+        elif len(value) < self._minlen:
+            # The expression can't match, so there are no tokens, or (with
+            # gaps) the whole text is one token
+            if self.gaps and value:
+                t.text = value
+                t.boost = 1.0
+                if keeporiginal:
+                    t.original = value
+                t.stopped = False
+                if positions:
+                    t.pos = start_pos
+                if chars:
+                    t.startchar = start_char
+                    t.endchar = start_char + len(value)
+                yield t
+        elif not self.gaps and not (positions or chars or keeporiginal):
+            # Expression matches are used as tokens, and only the text is
+            # needed, so skip the per-token flag tests below
+            for match in self.expression.finditer(value):
+                t.text = match[0]
+                t.boost = 1.0
+                t.stopped = False
+                yield t
         elif not self.gaps:
             # The default: expression matches are used as tokens
-            for pos, match in enumerate(self.expression.finditer(value)):
-                t.text = match.group(0)
+            pos = start_pos
+            for match in self.expression.finditer(value):
+                t.text = match[0]
                 t.boost = 1.0
                 if keeporiginal:
                     t.original = t.text
                 t.stopped = False
                 if positions:
-                    t.pos = start_pos + pos
+                    t.pos = pos
+                    pos += 1
                 if chars:
-                    t.startchar = start_char + match.start()
-                    t.endchar = start_char + match.end()
+                    start, end = match.span()
+                    t.startchar = start_char + start
+                    t.endchar = start_char + end
                 yield t
         else:
             # When gaps=True, iterate through the matches and
@@ -179,19 +236,16 @@ class RegexTokenizer(Tokenizer):
                 if positions:
                     t.pos = pos
                 if chars:
-                    t.startchar = prevend
-                    t.endchar = len(value)
+                    t.startchar = start_char + prevend
+                    t.endchar = start_char + len(value)
                 yield t
 
 
 class CharsetTokenizer(Tokenizer):
     """Tokenizes and translates text according to a character mapping object.
-    Characters that map to None are considered token break characters. For all
-    other characters the map is used to translate the character. This is useful
-    for case and accent folding.
-
-    This tokenizer loops character-by-character and so will likely be much
-    slower than :class:`RegexTokenizer`.
+    Characters that map to None (or are missing from the map) are considered
+    token break characters. For all other characters the map is used to
+    translate the character. This is useful for case and accent folding.
 
     One way to get a character mapping object is to convert a Sphinx charset
     table file using :func:`whoosh.support.charset.charset_table_to_dict`.
@@ -221,6 +275,39 @@ class CharsetTokenizer(Tokenizer):
                 and self.__class__ is other.__class__
                 and self.charmap == other.charmap)
 
+    def __getstate__(self):
+        # Don't pickle the word expression, it's rebuilt from the charmap
+        state = self.__dict__.copy()
+        state.pop("_wordexpr", None)
+        return state
+
+    def _word_expr(self):
+        # Returns a compiled expression matching runs of characters that the
+        # charmap doesn't map to None, so the tokenizer can find the token
+        # spans with finditer() instead of testing each character in Python
+        try:
+            return self._wordexpr
+        except AttributeError:
+            pass
+
+        ranges = []
+        for code in sorted(c for c, v in self.charmap.items() if v):
+            if ranges and ranges[-1][1] == code - 1:
+                ranges[-1][1] = code
+            else:
+                ranges.append([code, code])
+
+        if ranges:
+            cls = "".join(re.escape(unichr(a)) if a == b else
+                          "%s-%s" % (re.escape(unichr(a)), re.escape(unichr(b)))
+                          for a, b in ranges)
+            expr = re.compile("[%s]+" % cls)
+        else:
+            # Nothing maps to a word character, so nothing should match
+            expr = re.compile("(?!)")
+        self._wordexpr = expr
+        return expr
+
     def __call__(self, value, positions=False, chars=False, keeporiginal=False,
                  removestops=True, start_pos=0, start_char=0, tokenize=True,
                  mode='', **kwargs):
@@ -251,61 +338,133 @@ class CharsetTokenizer(Tokenizer):
                 t.endchar = start_char + len(value)
             yield t
         else:
-            text = u("")
             charmap = self.charmap
             pos = start_pos
-            startchar = currentchar = start_char
-            for char in value:
-                tchar = charmap[ord(char)]
-                if tchar:
-                    text += tchar
-                else:
-                    if currentchar > startchar:
-                        t.text = text
-                        t.boost = 1.0
-                        if keeporiginal:
-                            t.original = t.text
-                        if positions:
-                            t.pos = pos
-                            pos += 1
-                        if chars:
-                            t.startchar = startchar
-                            t.endchar = currentchar
-                        yield t
-                    startchar = currentchar + 1
-                    text = u("")
-
-                currentchar += 1
-
-            if currentchar > startchar:
-                t.text = value[startchar:currentchar]
+            # Find the runs of word characters with a regular expression and
+            # translate each token's span with one str.translate() call,
+            # instead of building the text up a character at a time
+            for match in self._word_expr().finditer(value):
+                start, end = match.span()
+                t.text = value[start:end].translate(charmap)
                 t.boost = 1.0
                 if keeporiginal:
                     t.original = t.text
+                t.stopped = False
                 if positions:
                     t.pos = pos
+                    pos += 1
                 if chars:
-                    t.startchar = startchar
-                    t.endchar = currentchar
+                    t.startchar = start_char + start
+                    t.endchar = start_char + end
                 yield t
 
 
+class DelimiterTokenizer(Tokenizer):
+    """Splits text into tokens at any of a set of delimiter characters, using
+    the ``str.split()`` method instead of a regular expression. Empty tokens
+    (between adjacent delimiters) are skipped.
+
+    >>> dt = DelimiterTokenizer(",;")
+    >>> [token.text for token in dt("alfa,bravo;;charlie")]
+    ["alfa", "bravo", "charlie"]
+    """
+
+    def __init__(self, delims=" \t\r\n"):
+        """
+        :param delims: a string containing the characters to split on.
+        """
+
+        if not delims:
+            raise ValueError("DelimiterTokenizer needs at least one delimiter")
+        self.delims = delims
+
+    def __eq__(self, other):
+        return (other and self.__class__ is other.__class__
+                and self.delims == other.delims)
+
+    def __call__(self, value, positions=False, chars=False, keeporiginal=False,
+                 removestops=True, start_pos=0, start_char=0, tokenize=True,
+                 mode='', **kwargs):
+        """
+        :param value: The unicode string to tokenize.
+        :param positions: Whether to record token positions in the token.
+        :param chars: Whether to record character offsets in the token.
+        :param start_pos: The position number of the first token. For example,
+            if you set start_pos=2, the tokens will be numbered 2,3,4,...
+            instead of 0,1,2,...
+        :param start_char: The offset of the first character of the first
+            token. For example, if you set start_char=2, the text "aaa bbb"
+            will have chars (2,5),(6,9) instead (0,3),(4,7).
+        :param tokenize: if True, the text should be tokenized.
+        """
+
+        assert isinstance(value, text_type), "%r is not unicode" % value
+
+        t = Token(positions, chars, removestops=removestops, mode=mode,
+                  **kwargs)
+        if not tokenize:
+            t.original = t.text = value
+            t.boost = 1.0
+            if positions:
+                t.pos = start_pos
+            if chars:
+                t.startchar = start_char
+                t.endchar = start_char + len(value)
+            yield t
+            return
+
+        # Replace every delimiter with the first one, so the text can be split
+        # on a single character (str.replace is much faster than translate)
+        delims = self.delims
+        sep = delims[0]
+        for delim in delims[1:]:
+            value = value.replace(delim, sep)
+        parts = value.split(sep)
+        if not (positions or chars or keeporiginal):
+            for part in parts:
+                if part:
+                    t.text = part
+                    t.boost = 1.0
+                    t.stopped = False
+                    yield t
+        else:
+            # Each part is followed by exactly one delimiter, so the offsets
+            # can be worked out from the part lengths
+            pos = start_pos
+            startchar = start_char
+            for part in parts:
+                endchar = startchar + len(part)
+                if part:
+                    t.text = part
+                    t.boost = 1.0
+                    if keeporiginal:
+                        t.original = part
+                    t.stopped = False
+                    if positions:
+                        t.pos = pos
+                        pos += 1
+                    if chars:
+                        t.startchar = startchar
+                        t.endchar = endchar
+                    yield t
+                startchar = endchar + 1
+
+
 def SpaceSeparatedTokenizer():
-    """Returns a RegexTokenizer that splits tokens by whitespace.
+    """Returns a tokenizer that splits tokens by whitespace.
 
     >>> sst = SpaceSeparatedTokenizer()
     >>> [token.text for token in sst("hi there big-time, what's up")]
     ["hi", "there", "big-time,", "what's", "up"]
     """
 
-    return RegexTokenizer(r"[^ \t\r\n]+")
+    return DelimiterTokenizer(" \t\r\n")
 
 
 def CommaSeparatedTokenizer():
     """Splits tokens by commas.
 
-    Note that the tokenizer calls unicode.strip() on each match of the regular
-    expression.
+    Note that the tokenizer calls unicode.strip() on each token.
 
     >>> cst = CommaSeparatedTokenizer()
     >>> [token.text for token in cst("hi there, what's , up")]
@@ -314,7 +473,7 @@ def CommaSeparatedTokenizer():
 
     from whoosh.analysis.filters import StripFilter
 
-    return RegexTokenizer(r"[^,]+") | StripFilter()
+    return DelimiterTokenizer(",") | StripFilter()
 
 
 class PathTokenizer(Tokenizer):
@@ -329,9 +488,25 @@ class PathTokenizer(Tokenizer):
         assert isinstance(value, text_type), "%r is not unicode" % value
         token = Token(positions, **kwargs)
         pos = start_pos
-        for match in self.expr.finditer(value):
-            token.text = value[:match.end()]
-            if positions:
-                token.pos = pos
-                pos += 1
-            yield token
+        if self.expr.pattern == "[^/]+":
+            # With the default expression, just look for the slashes
+            length = len(value)
+            start = 0
+            while start < length:
+                end = value.find("/", start)
+                if end < 0:
+                    end = length
+                if end > start:
+                    token.text = value[:end]
+                    if positions:
+                        token.pos = pos
+                        pos += 1
+                    yield token
+                start = end + 1
+        else:
+            for match in self.expr.finditer(value):
+                token.text = value[:match.end()]
+                if positions:
+                    token.pos = pos
+                    pos += 1
+                yield token
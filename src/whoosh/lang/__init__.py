@@ -27,6 +27,8 @@
 # those of the authors and should not be interpreted as representing official
 # policies, either expressed or implied, of Matt Chaput.
 
+from functools import lru_cache
+
 
 # Exceptions
 
@@ -96,6 +98,10 @@ def two_letter_code(name):
 
 # Getter functions
 
+# The answers only depend on the language name, and finding a stemmer builds a
+# stemmer object, so remember them
+
+@lru_cache(maxsize=128)
 def has_stemmer(lang):
     try:
         return bool(stemmer_for_language(lang))
@@ -103,6 +109,7 @@ def has_stemmer(lang):
         return False
 
 
+@lru_cache(maxsize=128)
 def has_stopwords(lang):
     try:
         return bool(stopwords_for_language(lang))
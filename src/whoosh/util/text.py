@@ -26,6 +26,13 @@
 # policies, either expressed or implied, of Matt Chaput.
 
 import codecs, re
+from functools import lru_cache
+
+try:
+    # Python 3.11 renamed the regular expression parser module
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
 
 from whoosh.compat import string_type, u, byte
 
@@ -129,4 +136,11 @@ def rcompile(pattern, flags=0, verbose=False):
         return pattern
     if verbose:
         flags |= re.VERBOSE
-    return re.compile(pattern, re.UNICODE | flags)
+    return _compile(pattern, re.UNICODE | flags)
+
+
+@lru_cache(maxsize=512)
+def _compile(pattern, flags):
+    # Analyzers and query parsers are often rebuilt with the same expressions,
+    # so skip the extra work re.compile() does before checking its own cache
+    return re.compile(pattern, flags)
@@ -2,11 +2,14 @@
 
 from __future__ import with_statement
 
+import re
+import sys
+
 import pytest
 
 from whoosh import analysis, fields, qparser
 from whoosh.compat import b, u, unichr
-from whoosh.compat import dumps
+from whoosh.compat import dumps, loads
 from whoosh.filedb.filestore import RamStorage
 
 
@@ -19,6 +22,41 @@ def test_regextokenizer():
     rex = analysis.RegexTokenizer("[A-Z]+", gaps=True)
     assert [t.text for t in rex(value)] == ["aaa", "bbb", "ccc", "ddd"]
 
+    ts = rex(value, chars=True, start_char=10)
+    assert [(t.startchar, t.endchar) for t in ts] == [(13, 16), (19, 22),
+                                                      (25, 28), (31, 34)]
+
+
+def test_regextokenizer_short_text():
+    # Text shorter than the shortest possible match skips the expression
+    rex = analysis.RegexTokenizer("[a-z]{3,}")
+    assert [t.text for t in rex(u("ab"))] == []
+    assert [t.text for t in rex(u("abc"))] == ["abc"]
+
+    rex = analysis.RegexTokenizer("[0-9]{3}", gaps=True)
+    ts = rex(u("ab"), positions=True, chars=True, start_pos=2, start_char=5)
+    assert [(t.text, t.pos, t.startchar, t.endchar) for t in ts] == \
+        [("ab", 2, 5, 7)]
+    assert [t.text for t in rex(u(""))] == []
+
+    rex2 = loads(dumps(rex, -1))
+    assert "_minlen" not in rex.__getstate__()
+    assert rex2._minlen == 3
+    assert [t.text for t in rex2(u("ab123cd"))] == ["ab", "cd"]
+    assert "_minlen" not in repr(rex)
+
+    # Other pattern objects with a compatible finditer() are still accepted
+    class Expression(object):
+        pattern = r"\p{L}+"
+        flags = 0
+
+        def finditer(self, value):
+            return re.finditer(r"[^\W\d_]+", value)
+
+    rex = analysis.RegexTokenizer(Expression())
+    assert rex._minlen == 0
+    assert [t.text for t in rex(u("ab 12 cd"))] == ["ab", "cd"]
+
 
 def test_path_tokenizer():
     value = u("/alfa/bravo/charlie/delta/")
@@ -27,6 +65,15 @@ def test_path_tokenizer():
                                            "/alfa/bravo/charlie",
                                            "/alfa/bravo/charlie/delta"]
 
+    # Repeated slashes don't produce extra tokens
+    value = u("alfa//bravo/")
+    assert [(t.text, t.pos) for t in pt(value, positions=True)] == \
+        [("alfa", 0), ("alfa//bravo", 1)]
+
+    # Custom expressions still work
+    pt = analysis.PathTokenizer("[^.]+")
+    assert [t.text for t in pt(u("a.b.c"))] == ["a", "a.b", "a.b.c"]
+
 
 def test_path_tokenizer2():
     path_field = fields.TEXT(analyzer=analysis.PathTokenizer())
@@ -45,6 +92,15 @@ def test_path_tokenizer2():
     assert b('/alfa') in [value for field, value in items]
 
 
+def test_token_copy():
+    t = analysis.Token(positions=True, text=u("alfa"), pos=3, payload=b("x"))
+    for t2 in (t.copy(), loads(dumps(t, -1)), loads(dumps(t, 0))):
+        assert t2 is not t
+        assert (t2.text, t2.pos, t2.payload) == (u("alfa"), 3, b("x"))
+        assert not hasattr(t2, "startchar")
+    assert "payload" in repr(t)
+
+
 def test_composition1():
     ca = analysis.RegexTokenizer() | analysis.LowercaseFilter()
     assert ca.__class__.__name__ == "CompositeAnalyzer"
@@ -69,6 +125,116 @@ def test_composition3():
     assert sa.__class__.__name__ == "CompositeAnalyzer"
 
 
+def test_composite_equality():
+    ana = analysis.StandardAnalyzer()
+    assert ana == ana
+    assert ana == analysis.StandardAnalyzer()
+    assert ana != analysis.StandardAnalyzer(maxsize=10)
+    assert ana != analysis.SimpleAnalyzer()
+    assert ana != None
+
+
+def test_empty_composite():
+    ana = analysis.CompositeAnalyzer()
+    assert len(ana) == 0
+    assert ana._chain == () and ana._fused is None
+    assert loads(dumps(ana, -1)) == ana
+
+
+def test_redundant_strip():
+    value = u("Alfa  bravo, charlie ")
+
+    ana = analysis.RegexTokenizer() | analysis.StripFilter()
+    assert ana._chain == ()
+    assert [t.text for t in ana(value)] == ["Alfa", "bravo", "charlie"]
+
+    ana = (analysis.RegexTokenizer() | analysis.LowercaseFilter()
+           | analysis.StripFilter() | analysis.StopFilter())
+    assert ana._fused is not None
+    assert [t.text for t in ana(value)] == ["alfa", "bravo", "charlie"]
+
+    ana = analysis.RegexTokenizer(r"[^,]+") | analysis.StripFilter()
+    assert len(ana._chain) == 1
+    assert [t.text for t in ana(value)] == ["Alfa  bravo", "charlie"]
+
+    # An untokenized value is passed through whole, so it still gets stripped
+    ana = analysis.RegexTokenizer() | analysis.StripFilter()
+    assert [t.text for t in ana(u(" Foo bar "), tokenize=False)] == \
+        ["Foo bar"]
+    ana = (analysis.RegexTokenizer() | analysis.LowercaseFilter()
+           | analysis.StripFilter() | analysis.StopFilter())
+    assert [t.text for t in ana(u(" Foo bar "), tokenize=False)] == \
+        ["foo bar"]
+
+    # With re.ASCII, \S matches Unicode whitespace that strip() removes
+    ana = (analysis.RegexTokenizer(re.compile(r"\S+", re.ASCII))
+           | analysis.StripFilter())
+    assert [t.text for t in ana(u("\xa0foo\xa0"))] == ["foo"]
+
+
+def test_fused_composition():
+    def staged(ana, value, **kwargs):
+        gen = ana[0](value, **kwargs)
+        for item in ana[1:]:
+            gen = item(gen)
+        return [(t.text, t.pos, t.startchar, t.endchar, t.stopped)
+                for t in gen]
+
+    def fused(ana, value, **kwargs):
+        return [(t.text, t.pos, t.startchar, t.endchar, t.stopped)
+                for t in ana(value, **kwargs)]
+
+    value = u("The Rendering of AN Image is Rendered by renderers X Y")
+    for ana in (analysis.StandardAnalyzer(),
+                analysis.StandardAnalyzer(maxsize=8),
+                analysis.StemmingAnalyzer(ignore=["renderers"]),
+                analysis.LanguageAnalyzer("en"),
+                (analysis.RegexTokenizer() | analysis.LowercaseFilter()
+                 | analysis.StemFilter())):
+        assert ana._fused is not None
+        for removestops in (True, False):
+            kwargs = dict(positions=True, chars=True, removestops=removestops)
+            assert fused(ana, value, **kwargs) == staged(ana, value, **kwargs)
+
+    ana = analysis.StandardAnalyzer() | analysis.BiWordFilter()
+    assert ana._fused is None
+
+    # Lowercasing the whole value up front must not change the tokens
+    ana = analysis.SimpleAnalyzer()
+    assert ana._fused is not None
+    for v in (value, u("Stra\xdfe \u0130stanbul Caf\xc9")):
+        kwargs = dict(positions=True, chars=True)
+        assert fused(ana, v, **kwargs) == staged(ana, v, **kwargs)
+    originals = [t.original for t in ana(u("AB cd"), keeporiginal=True)]
+    assert originals == ["AB", "cd"]
+    ts = [(t.text, t.original) for t in ana(u("ABC Def"), tokenize=False)]
+    assert ts == [("abc def", "ABC Def")]
+
+    ana = analysis.RegexTokenizer("[A-Z]+") | analysis.LowercaseFilter()
+    assert ana._fused is None
+    assert [t.text for t in ana(u("ABcDE"))] == ["ab", "de"]
+
+    # Case-sensitive parts hidden from a simple look at the pattern text
+    ana = (analysis.RegexTokenizer(r"(?i)x(?-i:[A-Z]+)")
+           | analysis.LowercaseFilter())
+    assert [t.text for t in ana(u("ABC xDEF"))] == ["xdef"]
+    ana = analysis.RegexTokenizer(r"[!-_]+") | analysis.LowercaseFilter()
+    assert [t.text for t in ana(u("ABC xDEF"))] == ["abc", "def"]
+    ana = (analysis.RegexTokenizer(re.compile("[a-z]+", re.IGNORECASE))
+           | analysis.LowercaseFilter())
+    assert ana._prelower
+    assert [t.text for t in ana(u("ABC xDEF"))] == ["abc", "xdef"]
+
+    ana = analysis.StemmingAnalyzer()
+    texts = [t.text for t in ana(value, no_morph=True)]
+    assert texts == ["rendering", "image", "rendered", "renderers"]
+
+    ana = loads(dumps(ana, -1))
+    assert ana._fused is not None
+    assert [t.text for t in ana(value)] == ["render", "imag", "render",
+                                            "render"]
+
+
 def test_composing_functions():
     tokenizer = analysis.RegexTokenizer()
 
@@ -99,6 +265,36 @@ def test_multifilter():
     text = u("ALFA BRAVO CHARLIE")
     assert [t.text for t in ana(text, mode="a")] == ["alfa", "bravo", "charlie"]
     assert [t.text for t in ana(text, mode="b")] == ["ALFA", "BRAVO", "CHARLIE"]
+    assert [t.text for t in ana(u(""), mode="a")] == []
+
+
+def test_logging_filter():
+    import logging
+
+    class ListHandler(logging.Handler):
+        def __init__(self):
+            logging.Handler.__init__(self)
+            self.messages = []
+
+        def emit(self, record):
+            self.messages.append(record.getMessage())
+
+    logger = logging.getLogger("whoosh.test.analysis")
+    logger.propagate = False
+    handler = ListHandler()
+    logger.addHandler(handler)
+    ana = analysis.RegexTokenizer() | analysis.LoggingFilter(logger)
+    text = u("alfa bravo")
+
+    logger.setLevel(logging.INFO)
+    assert [t.text for t in ana(text)] == ["alfa", "bravo"]
+    assert handler.messages == []
+
+    logger.setLevel(logging.DEBUG)
+    assert [t.text for t in ana(text)] == ["alfa", "bravo"]
+    assert len(handler.messages) == 2
+    assert "alfa" in handler.messages[0]
+    logger.removeHandler(handler)
 
 
 def test_tee_filter():
@@ -324,6 +520,64 @@ def test_porter2():
     assert stem("y's") == "y"
 
 
+def test_stem_cache():
+    words = u("rendering renders rendered rendering renders").split()
+    target = ["render"] * 5
+
+    for cachesize in (None, 0, 1, 3, -1):
+        sf = analysis.StemFilter(cachesize=cachesize)
+        tokens = analysis.RegexTokenizer()(u(" ").join(words))
+        assert [t.text for t in sf(tokens)] == target
+        if cachesize:
+            hits, misses, _, _ = sf.cache_info()
+            assert hits + misses == 5
+        else:
+            assert sf.cache_info() is None
+
+
+def test_pystemmer_stub(monkeypatch):
+    import types
+
+    # A stand-in for the py-stemmer module whose stems are easy to recognize
+    class Stemmer(object):
+        def __init__(self, lang):
+            self.lang = lang
+            self.maxCacheSize = None
+
+        def stemWord(self, word):
+            return word[:4]
+
+    module = types.ModuleType("Stemmer")
+    module.Stemmer = Stemmer
+    module.algorithms = lambda: ["english"]
+    monkeypatch.setitem(sys.modules, "Stemmer", module)
+
+    sf = analysis.PyStemmerFilter()
+    # clear() must keep py-stemmer's function, not the pure-Python stemmer
+    sf.clear()
+    assert sf._stem.__self__.__class__ is Stemmer
+    assert sf.cache_info() is None
+
+    sf2 = loads(dumps(sf, -1))
+    assert sf2 == sf
+    assert sf2._stem.__self__.__class__ is Stemmer
+    assert sf2.cachesize == 10000
+
+    assert analysis.PyStemmerFilter(ignore=["x"]) != analysis.PyStemmerFilter()
+    assert analysis.PyStemmerFilter("spanish") != analysis.PyStemmerFilter()
+
+    ana = (analysis.RegexTokenizer() | analysis.LowercaseFilter()
+           | analysis.StopFilter() | analysis.PyStemmerFilter(ignore=["rains"]))
+    assert ana._fused is not None
+    value = u("The Rains are Falling STRANGELY on the plain")
+    gen = ana[0](value)
+    for item in ana[1:]:
+        gen = item(gen)
+    staged = [t.text for t in gen]
+    assert staged == ["rains", "fall", "stra", "plai"]
+    assert [t.text for t in ana(value)] == staged
+
+
 #def test_pystemmer():
 #    Stemmer = pytest.importorskip("Stemmer")
 #
@@ -466,6 +720,60 @@ def test_charset_pickeability():
     _ = dumps(ana, -1)
 
 
+def test_charset_tokenizer():
+    from whoosh.support import charset
+    charmap = charset.charset_table_to_dict(charset.default_charset)
+    ana = analysis.CharsetTokenizer(charmap)
+
+    value = u("Stra\xdfe  ABC")
+    tokens = [(t.text, t.pos, t.startchar, t.endchar)
+              for t in ana(value, positions=True, chars=True, start_char=10)]
+    assert tokens == [(u("strase"), 0, 10, 16), (u("abc"), 1, 18, 21)]
+    assert [t.text for t in ana(u("-a-b-"))] == ["a", "b"]
+    assert [t.text for t in ana(u(""))] == []
+
+    # The cached word expression isn't pickled
+    ana2 = loads(dumps(ana, -1))
+    assert "_wordexpr" not in ana2.__dict__
+    assert ana2 == ana
+    assert [t.text for t in ana2(value)] == ["strase", "abc"]
+
+    assert [t.text for t in analysis.CharsetTokenizer({})(u("abc"))] == []
+
+
+def test_delimiter_tokenizer():
+    sst = analysis.SpaceSeparatedTokenizer()
+    value = u(" alfa\tbravo\r\n\xa0charlie ")
+    tokens = [(t.text, t.pos, t.startchar, t.endchar)
+              for t in sst(value, positions=True, chars=True, start_char=10)]
+    assert tokens == [(u("alfa"), 0, 11, 15), (u("bravo"), 1, 16, 21),
+                      (u("\xa0charlie"), 2, 23, 31)]
+    assert [t.text for t in sst(u(""))] == []
+
+    cst = analysis.CommaSeparatedTokenizer()
+    assert [t.text for t in cst(u("hi there, what's ,, up"))] == \
+        ["hi there", "what's", "up"]
+
+    assert sst == analysis.DelimiterTokenizer()
+    assert sst != analysis.DelimiterTokenizer(",")
+    with pytest.raises(ValueError):
+        analysis.DelimiterTokenizer("")
+
+
+def test_tokenize_batch():
+    ana = analysis.StemmingAnalyzer()
+    texts = [u("Alfa bravo charlie"), u(""), u("the running DELTA echo")] * 5
+
+    def attrs(tokens):
+        return [(t.text, t.pos, t.startchar, t.endchar) for t in tokens]
+
+    target = [attrs(ana(text, positions=True, chars=True)) for text in texts]
+    for procs in (1, 2):
+        result = analysis.tokenize_batch(ana, texts, procs=procs, chunksize=4,
+                                         positions=True, chars=True)
+        assert [attrs(tokens) for tokens in result] == target
+
+
 def test_shingle_stopwords():
     # Note that the stop list is None here
     ana = (analysis.RegexTokenizer()
@@ -518,6 +826,14 @@ def test_stop_lang():
     ls = [token.text for token in es_stopper(u("el lapiz es en la mesa"))]
     assert ls == ["lapiz", "mesa"]
 
+    # The stop list can be replaced with a plain (unhashable) set
+    sf = analysis.StopFilter()
+    sf.stops = set(["the"])
+    for ana in (analysis.RegexTokenizer() | sf,
+                analysis.RegexTokenizer() | analysis.LowercaseFilter() | sf):
+        ls = [token.text for token in ana(u("the is a test"))]
+        assert ls == ["is", "test"]
+
 
 def test_issue358():
     t = analysis.RegexTokenizer("\w+")
@@ -29,3 +29,20 @@ def test_spanish_spell_suffix():
     s = SpanishStemmer()
     w = s.stem(word)
     assert w == "tgu"
+
+
+def test_has_language():
+    from whoosh import lang
+
+    assert lang.has_stemmer("en")
+    assert lang.has_stemmer("french")
+    assert not lang.has_stemmer("xx")
+    assert lang.has_stopwords("de")
+    assert not lang.has_stopwords("xx")
+    # Repeated lookups come from the cache
+    hits = lang.has_stemmer.cache_info().hits
+    assert lang.has_stemmer("en")
+    assert lang.has_stemmer.cache_info().hits == hits + 1
+    hits = lang.has_stopwords.cache_info().hits
+    assert not lang.has_stopwords("xx")
+    assert lang.has_stopwords.cache_info().hits == hits + 1